@@ -30,7 +30,9 @@ import stripe
 import os
 import argparse
 import re
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from dateutil import parser
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -40,12 +42,118 @@ from googleapiclient.errors import HttpError
 import json
 import logging
 import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Meeting ID marker appended to invoice line item descriptions, e.g. "[ID:abc123]"
+_MEETING_ID_RE = re.compile(r'\[ID:([^\]]+)\]')
+
+# Meeting invoice status implied by each Stripe invoice status; void invoices are absent
+_MEETING_STATUS_BY_INVOICE_STATUS = {
+    'draft': 'drafted',
+    'open': 'sent',
+    'paid': 'sent',
+    'uncollectible': 'sent',
+}
+
+# Email addresses mentioned in free text such as event descriptions
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+# Whatever follows an '@' in free text; unlike _EMAIL_RE this doesn't depend on
+# the local part, so o'neil@... and josé@... still yield their domain
+_MENTION_DOMAIN_RE = re.compile(r'@([\w.-]+)')
+
+def _amount_in_cents(duration, rate):
+    """Line item amount in integer cents, rounded half-up
+
+    Goes through Decimal on the decimal strings so values like 0.29h don't
+    truncate a cent (0.29 * 100 * 100 == 2899.999... as floats).
+    """
+    cents = Decimal(str(duration)) * Decimal(str(rate)) * 100
+    return int(cents.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+# Time input: "2:30 PM", "2PM", "14:30" or "14" (hour, optional minutes, optional AM/PM)
+_TIME_RE = re.compile(r'(\d{1,2})(?::(\d{1,2}))?\s*([AaPp][Mm])?')
+
+# Duration input: a number with an optional "h"/"hr"/"hrs"/"hour"/"hours" suffix
+_DURATION_RE = re.compile(r'([-+]?(?:\d+\.?\d*|\.\d+))\s*(?:h|hrs?|hours?)?')
+
+# Characters stripped from hourly rate input before parsing, e.g. "$1,000"
+_RATE_FORMATTING = str.maketrans('', '', '$,')
+
+def _occurs_near(text, needle, positions, distance):
+    """Whether needle occurs in text less than distance from one of the sorted positions
+
+    Checks each occurrence as str.find reaches it and stops at the first close
+    one, so the rest of the text isn't searched once a match is certain.
+    """
+    pos = text.find(needle)
+    while pos != -1:
+        # Only the nearest position on either side can be in range
+        i = bisect_left(positions, pos)
+        if (i < len(positions) and positions[i] - pos < distance) or (i and pos - positions[i - 1] < distance):
+            return True
+        pos = text.find(needle, pos + 1)
+    return False
+
+def _find_all(text, needle):
+    """Start offsets of every occurrence of needle in text, in order"""
+    positions = []
+    pos = text.find(needle)
+    while pos != -1:
+        positions.append(pos)
+        pos = text.find(needle, pos + 1)
+    return positions
+
+def _mention_index(customers):
+    """Lowercase domain -> {lowercase email: lowercase names} for customers that can be mentioned
+
+    Customers without a real name or an address are left out, since a text
+    mention needs both. Stripe allows several customers to share an address,
+    hence the name lists.
+    """
+    index = {}
+    for customer in customers:
+        name = customer.get('name', '').lower()
+        email = customer.get('email', '').lower()
+        if name and name != 'unknown' and '@' in email:
+            domain = email.rpartition('@')[2]
+            index.setdefault(domain, {}).setdefault(email, []).append(name)
+    return index
+
+@lru_cache(maxsize=4096)
+def _hash_meeting(customer_email, start_time, summary):
+    """Meeting ID from customer email, start time, and summary (cached; IDs are re-derived every run)
+
+    Must stay MD5: IDs are embedded in past invoice line items ("[ID:...]"),
+    and a different hash would make already-invoiced meetings look unbilled.
+    """
+    meeting_string = f"{customer_email}|{start_time}|{summary}"
+    return hashlib.md5(meeting_string.encode(), usedforsecurity=False).hexdigest()[:12]
+
+def _clock_seconds(timestamp):
+    """Seconds since midnight for the HH:MM:SS part of an ISO "YYYY-MM-DDTHH:MM:SS..." string"""
+    if timestamp[13] != ':' or timestamp[16] != ':':
+        raise ValueError(f"Not an ISO clock time: {timestamp}")
+    return int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+
+@lru_cache(maxsize=8192)
+def _parse_datetime(value):
+    """Parse a calendar date/time string (cached; recurring events repeat the same values)
+
+    Google Calendar sends ISO 8601, which datetime.fromisoformat handles in C;
+    anything else falls back to dateutil's slower, more lenient parser.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.parse(value)
+
 class StripeCalendarInvoicer:
     def __init__(self, stripe_api_key, calendar_credentials_file='credentials.json', 
                  token_file='token.json', days_back=7):
@@ -144,34 +252,63 @@ class StripeCalendarInvoicer:
     
     def generate_meeting_id(self, customer_email, start_time, summary):
         """Generate a unique identifier for a meeting"""
-        # Create a hash from customer email, start time, and summary
-        meeting_string = f"{customer_email}|{start_time}|{summary}"
-        return hashlib.md5(meeting_string.encode()).hexdigest()[:12]
+        return _hash_meeting(customer_email, start_time, summary)
     
-    def get_customer_invoices(self, customer_id):
-        """Get all invoices for a customer"""
+    def get_customer_invoices(self, customer_id, created_after=None):
+        """Get all invoices for a customer
+        
+        Args:
+            customer_id: Stripe customer ID
+            created_after: Optional Unix timestamp; only invoices created at or after it are returned
+        """
+        params = {'customer': customer_id, 'limit': 100}
+        if created_after is not None:
+            params['created'] = {'gte': created_after}
+        
         try:
-            invoices = stripe.Invoice.list(customer=customer_id, limit=100)
+            invoices = stripe.Invoice.list(**params)
             return invoices.data
         except Exception as e:
             logger.error(f"Error fetching invoices for customer {customer_id}: {e}")
             return []
     
-    def check_meeting_invoice_status(self, customer_id, meeting_id):
-        """Check if a meeting has been invoiced and return status"""
-        invoices = self.get_customer_invoices(customer_id)
+    def extract_meeting_id(self, description):
+        """Extract the meeting ID from an invoice line item description"""
+        if not description or '[ID:' not in description:
+            return None
+        match = _MEETING_ID_RE.search(description)
+        return match.group(1) if match else None
+    
+    def get_meeting_invoice_statuses(self, customer_id, created_after=None):
+        """Map each invoiced meeting ID for a customer to its invoice status
+        
+        Fetches the customer's invoices once so callers can look up any number
+        of meetings without further Stripe requests. created_after limits the
+        fetch to invoices created at or after that Unix timestamp.
+        """
+        statuses = {}
         
-        for invoice in invoices:
-            # Check line items for this meeting ID - line items are in the lines property
+        for invoice in self.get_customer_invoices(customer_id, created_after=created_after):
+            status = _MEETING_STATUS_BY_INVOICE_STATUS.get(invoice.status)
+            if status is None:
+                continue  # Void invoices don't count as billed
+            
+            # Line items are in the lines property
             if hasattr(invoice, 'lines') and invoice.lines:
                 for item in invoice.lines.data:
-                    if meeting_id in (item.description or ""):
-                        if invoice.status == 'draft':
-                            return 'drafted'
-                        elif invoice.status in ['open', 'paid', 'uncollectible']:
-                            return 'sent'
+                    meeting_id = self.extract_meeting_id(item.description)
+                    if meeting_id and meeting_id not in statuses:
+                        statuses[meeting_id] = status
         
-        return 'not_invoiced'
+        return statuses
+    
+    def check_meeting_invoice_status(self, customer_id, meeting_id):
+        """Check if a meeting has been invoiced and return status
+        
+        Fetches the customer's invoices on every call; use
+        get_meeting_invoice_statuses to look up several meetings at once.
+        """
+        return self.get_meeting_invoice_statuses(customer_id).get(meeting_id, 'not_invoiced')
     
     def set_customer_hourly_rate(self, customer_id, hourly_rate):
         """Set hourly rate for a specific customer in Stripe metadata"""
@@ -204,109 +341,107 @@ class StripeCalendarInvoicer:
     
     def parse_time_input(self, time_str):
         """Parse various time formats into datetime object"""
-        if not time_str or time_str.strip() == "":
+        time_str = time_str.strip() if time_str else ""
+        if not time_str:
             return None
-            
-        time_str = time_str.strip()
-        
-        # Try different time formats
-        formats = [
-            "%I:%M %p",      # 2:30 PM
-            "%I:%M%p",       # 2:30PM
-            "%H:%M",         # 14:30
-            "%I %p",         # 2 PM
-            "%I%p",          # 2PM
-            "%H"             # 14
-        ]
         
-        for fmt in formats:
-            try:
-                return datetime.strptime(time_str, fmt).time()
-            except ValueError:
-                continue
+        match = _TIME_RE.fullmatch(time_str)
+        if match:
+            hour, minute, meridiem = match.groups()
+            hour, minute = int(hour), int(minute or 0)
+            if meridiem:
+                # 12-hour clock: 12 AM is midnight, 12 PM is noon
+                if 1 <= hour <= 12 and minute < 60:
+                    return time(hour % 12 + (12 if meridiem.upper() == 'PM' else 0), minute)
+            elif hour < 24 and minute < 60:
+                return time(hour, minute)
         
         raise ValueError(f"Unable to parse time: {time_str}")
     
     def parse_duration_input(self, duration_str):
         """Parse duration input into hours (float)"""
-        if not duration_str or duration_str.strip() == "":
+        duration_str = duration_str.strip().lower() if duration_str else ""
+        if not duration_str:
             return None
-            
-        duration_str = duration_str.strip().lower()
         
-        # Remove common suffixes (order matters - longer patterns first)
-        duration_str = duration_str.replace('hours', '').replace('hour', '').replace('hr', '').replace('h', '').strip()
-        
-        try:
-            # Handle formats like "1.5", "2", "0.5"
+        if duration_str.replace('.', '', 1).isdecimal():
+            # Bare numbers like "1.5", "2", "0.5" need no pattern matching
             duration = float(duration_str)
-            if duration <= 0 or duration > 24:
-                raise ValueError("Duration must be between 0 and 24 hours")
-            return duration
-        except ValueError as e:
-            # Re-raise our specific error messages
-            if "Duration must be between" in str(e):
-                raise
-            # Otherwise it's a parsing error
-            raise ValueError(f"Unable to parse duration: {duration_str}")
+        else:
+            # Otherwise allow a sign and an optional hours suffix
+            match = _DURATION_RE.fullmatch(duration_str)
+            if not match:
+                raise ValueError(f"Unable to parse duration: {duration_str}")
+            duration = float(match.group(1))
+        
+        if duration <= 0 or duration > 24:
+            raise ValueError("Duration must be between 0 and 24 hours")
+        return duration
     
     def validate_hourly_rate(self, rate_str):
         """Validate and parse hourly rate input"""
-        if not rate_str or rate_str.strip() == "":
+        rate_str = rate_str.strip() if rate_str else ""
+        if not rate_str:
             return None
-            
-        rate_str = rate_str.strip().replace('$', '').replace(',', '')
+        
+        # Drop currency formatting ("$1,000" -> "1000") in a single pass
+        rate_str = rate_str.translate(_RATE_FORMATTING)
         
         try:
             rate = float(rate_str)
-            if rate <= 0 or rate > 10000:
-                raise ValueError("Rate must be between $0 and $10,000")
-            return rate
-        except ValueError as e:
-            # Re-raise our specific error messages
-            if "Rate must be between" in str(e):
-                raise
-            # Otherwise it's a parsing error
-            raise ValueError(f"Unable to parse rate: {rate_str}")
+        except ValueError:
+            raise ValueError(f"Unable to parse rate: {rate_str}") from None
+        
+        if not 0 < rate <= 10000:
+            raise ValueError("Rate must be between $0 and $10,000")
+        return rate
     
     def extract_emails_from_text(self, text):
         """Extract email addresses from text using regex"""
-        if not text:
+        # Most descriptions (agendas, meeting links) contain no address at all;
+        # a C-level '@' check skips running the regex over them
+        if not text or '@' not in text:
             return set()
         
-        # Email regex pattern
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, text, re.IGNORECASE)
-        
         # Return lowercase set of unique emails
-        return set(email.lower() for email in emails)
+        return {email.lower() for email in _EMAIL_RE.findall(text)}
     
-    def find_customer_mentions_in_text(self, text, customers):
-        """Find customer names mentioned in text along with their emails"""
-        if not text:
+    def find_customer_mentions_in_text(self, text, customers, mention_index=None):
+        """Find customer names mentioned in text along with their emails
+        
+        mention_index may pass in _mention_index(customers) when scanning many
+        texts against the same customers, so it isn't rebuilt for each one.
+        """
+        # Every customer address contains an '@', so text without one can't match
+        if not text or '@' not in text:
+            return set()
+        
+        if mention_index is None:
+            mention_index = _mention_index(customers)
+        
+        # Only customers whose domain follows an '@' in the text can be mentioned,
+        # so one regex pass picks the candidates instead of scanning for everyone
+        candidates = [
+            mention_index[domain] for domain in {d.lower().rstrip('.') for d in _MENTION_DOMAIN_RE.findall(text)}
+            if domain in mention_index
+        ]
+        if not candidates:
             return set()
         
         found_emails = set()
         text_lower = text.lower()
         
-        # Check for each customer's name and email in the text
-        for customer in customers:
-            customer_name = customer.get('name', '').lower()
-            customer_email = customer.get('email', '').lower()
-            
-            # Skip if no name
-            if not customer_name or customer_name == 'unknown':
-                continue
-                
-            # Check if both name and email appear close to each other
-            # Look for patterns like "Name email@domain.com" or "email@domain.com (Name)"
-            if customer_name in text_lower and customer_email in text_lower:
-                # Simple proximity check - if both exist in text, consider it a match
-                name_pos = text_lower.find(customer_name)
-                email_pos = text_lower.find(customer_email)
+        for names_by_email in candidates:
+            for customer_email, customer_names in names_by_email.items():
+                # The customer's own address is the source of truth; the email
+                # regex misses valid ones such as o'neil@... or josé@...
+                email_positions = _find_all(text_lower, customer_email)
+                if not email_positions:
+                    continue
                 
-                # If name and email are within 100 characters of each other
-                if abs(name_pos - email_pos) < 100:
+                # Check if both name and email appear close to each other
+                # Look for patterns like "Name email@domain.com" or "email@domain.com (Name)"
+                if any(_occurs_near(text_lower, name, email_positions, 100) for name in customer_names):
                     found_emails.add(customer_email)
         
         return found_emails
@@ -339,33 +474,24 @@ class StripeCalendarInvoicer:
     def get_stripe_customers(self):
         """Fetch all customers from Stripe with email addresses"""
         logger.info("Fetching Stripe customers...")
-        customers = []
         
         try:
-            # Fetch customers in batches
-            has_more = True
-            starting_after = None
+            # Let the Stripe client walk the pages for us (100 customers per request)
+            response = stripe.Customer.list(limit=100)
             
-            while has_more:
-                params = {'limit': 100}
-                if starting_after:
-                    params['starting_after'] = starting_after
-                
-                response = stripe.Customer.list(**params)
-                
-                for customer in response.data:
-                    if customer.email:  # Only include customers with email addresses
-                        customers.append({
-                            'id': customer.id,
-                            'email': customer.email.lower(),
-                            'name': customer.name or 'Unknown',
-                            'created': customer.created,
-                            'metadata': customer.metadata or {}
-                        })
-                
-                has_more = response.has_more
-                if has_more:
-                    starting_after = response.data[-1].id
+            # Only include customers with email addresses; copy metadata into a
+            # plain dict so no StripeObject references outlive the listing
+            customers = [
+                {
+                    'id': customer.id,
+                    'email': email.lower(),
+                    'name': customer.name or 'Unknown',
+                    'created': customer.created,
+                    'metadata': dict(customer.metadata or {})
+                }
+                for customer in response.auto_paging_iter()
+                if (email := customer.email)
+            ]
             
             logger.info(f"Found {len(customers)} customers with email addresses")
             return customers
@@ -379,15 +505,7 @@ class StripeCalendarInvoicer:
         logger.info(f"Fetching calendar events from {start_date} to {end_date}")
         
         try:
-            events_result = self.calendar_service.events().list(
-                calendarId='primary',
-                timeMin=start_date.isoformat() + 'Z',
-                timeMax=end_date.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            events = list(self._iter_calendar_events(start_date, end_date))
             logger.info(f"Found {len(events)} calendar events")
             return events
             
@@ -395,16 +513,56 @@ class StripeCalendarInvoicer:
             logger.error(f"Error fetching calendar events: {e}")
             return []
     
+    def _iter_calendar_events(self, start_date, end_date):
+        """Yield calendar events in the date range, following result pages"""
+        events_api = self.calendar_service.events()
+        request = events_api.list(
+            calendarId='primary',
+            timeMin=start_date.isoformat() + 'Z',
+            timeMax=end_date.isoformat() + 'Z',
+            singleEvents=True,
+            orderBy='startTime'
+        )
+        
+        while request is not None:
+            response = request.execute()
+            yield from response.get('items', [])
+            request = events_api.list_next(request, response)
+    
     def calculate_meeting_duration(self, start_time, end_time):
         """Calculate meeting duration in hours"""
+        # Fast path: "YYYY-MM-DDTHH:MM:SS" times with the same UTC offset, which is
+        # what Google Calendar returns for ordinary meetings; whole days are only
+        # counted when the meeting runs past midnight
+        try:
+            if start_time[10] == 'T' and start_time[19:] == end_time[19:]:
+                seconds = _clock_seconds(end_time) - _clock_seconds(start_time)
+                if start_time[:10] != end_time[:10]:
+                    days = date.fromisoformat(end_time[:10]) - date.fromisoformat(start_time[:10])
+                    seconds += days.days * 86400
+                return round(seconds / 3600, 2)
+        except (TypeError, IndexError, ValueError):
+            pass  # Not a plain clock time; let the full parser decide
+        
         try:
-            start = parser.parse(start_time)
-            end = parser.parse(end_time)
+            start = _parse_datetime(start_time)
+            end = _parse_datetime(end_time)
             duration = end - start
             return round(duration.total_seconds() / 3600, 2)  # Convert to hours
         except:
             return 1.0  # Default to 1 hour if calculation fails
     
+    def _earliest_event_start(self, events):
+        """Earliest event start as a Unix timestamp, or None if no start can be parsed"""
+        starts = []
+        for event in events:
+            start = event.get('start', {})
+            try:
+                starts.append(_parse_datetime(start.get('dateTime') or start.get('date')).timestamp())
+            except (TypeError, ValueError, OverflowError):
+                continue
+        return min(starts) if starts else None
+    
     def find_customers_with_meetings(self, customers, events, include_all_meetings=False):
         """Find customers who had meetings and return meeting details with invoice status
         
@@ -419,40 +577,29 @@ class StripeCalendarInvoicer:
         customers_with_meetings = {}
         unassociated_meetings = []
         
-        # Create a mapping of email to customer
-        customer_by_email = {customer['email']: customer for customer in customers}
+        # Index customers by lowercase email; participant emails are lowercased below
+        customer_by_email = {customer['email'].lower(): customer for customer in customers}
+        
+        # Built once for the run rather than for every event description
+        mention_index = _mention_index(customers)
+        
+        customer_events = []  # Events matched to at least one customer
         
         for event in events:
-            # Extract meeting details
-            start_time = event.get('start', {}).get('dateTime', event.get('start', {}).get('date'))
-            end_time = event.get('end', {}).get('dateTime', event.get('end', {}).get('date'))
+            # Extract meeting details (timed events use dateTime, all-day events use date)
+            start, end = event.get('start', {}), event.get('end', {})
+            start_time = start.get('dateTime') or start.get('date')
+            end_time = end.get('dateTime') or end.get('date')
             summary = event.get('summary', 'Meeting')
             
             if not start_time or not end_time:
                 continue
             
-            # Calculate duration
-            duration = self.calculate_meeting_duration(start_time, end_time)
-            
-            # Format date for display
-            try:
-                meeting_date = parser.parse(start_time).strftime('%Y-%m-%d')
-                meeting_time = parser.parse(start_time).strftime('%I:%M %p')
-            except:
-                meeting_date = start_time[:10] if len(start_time) >= 10 else start_time
-                meeting_time = "Unknown time"
-            
-            # Check all attendees and organizer
-            participant_emails = set()
-            detection_sources = {}  # Track where each email was found
-            
-            # Check attendees
-            attendees = event.get('attendees', [])
-            for attendee in attendees:
-                if attendee.get('email'):
-                    email = attendee['email'].lower()
-                    participant_emails.add(email)
-                    detection_sources[email] = 'attendee'
+            # Check all attendees and organizer (lowercased once per event)
+            participant_emails = {
+                attendee['email'].lower() for attendee in event.get('attendees', []) if attendee.get('email')
+            }
+            detection_sources = dict.fromkeys(participant_emails, 'attendee')  # Track where each email was found
             
             # Check organizer
             organizer = event.get('organizer', {})
@@ -467,8 +614,11 @@ class StripeCalendarInvoicer:
                 # Extract all emails from description
                 description_emails = self.extract_emails_from_text(description)
                 
-                # Also check for customer name mentions
-                name_mention_emails = self.find_customer_mentions_in_text(description, customers)
+                # Name mentions also catch customer addresses the regex can't
+                # extract (e.g. o'neil@...)
+                name_mention_emails = self.find_customer_mentions_in_text(
+                    description, customers, mention_index=mention_index
+                )
                 
                 # Add all found emails from description
                 for email in description_emails.union(name_mention_emails):
@@ -476,49 +626,64 @@ class StripeCalendarInvoicer:
                         participant_emails.add(email)
                         detection_sources[email] = 'description'
             
+            # Skip events with no customer unless unassociated meetings are wanted,
+            # so internal events never pay for duration and date parsing
+            matched_emails = participant_emails & customer_by_email.keys()
+            if not matched_emails and not include_all_meetings:
+                continue
+            if matched_emails:
+                customer_events.append(event)
+            
+            # Calculate duration
+            duration = self.calculate_meeting_duration(start_time, end_time)
+            
+            # Format date for display
+            try:
+                start_dt = _parse_datetime(start_time)
+                meeting_date = start_dt.strftime('%Y-%m-%d')
+                meeting_time = start_dt.strftime('%I:%M %p')
+            except:
+                meeting_date = start_time[:10] if len(start_time) >= 10 else start_time
+                meeting_time = "Unknown time"
+            
             # Find matching customers
-            customer_found = False
-            for email in participant_emails:
-                if email in customer_by_email:
-                    customer_found = True
-                    customer = customer_by_email[email]
-                    customer_id = customer['id']
-                    
-                    # Generate unique meeting ID
-                    meeting_id = self.generate_meeting_id(email, start_time, summary)
-                    
-                    # Check invoice status
-                    invoice_status = self.check_meeting_invoice_status(customer_id, meeting_id)
-                    
-                    if customer_id not in customers_with_meetings:
-                        customers_with_meetings[customer_id] = {
-                            'customer': customer,
-                            'meetings': []
-                        }
-                    
-                    # Add meeting details
-                    meeting_info = {
-                        'id': meeting_id,
-                        'summary': summary,
-                        'date': meeting_date,
-                        'time': meeting_time,
-                        'duration': duration,
-                        'start_time': start_time,
-                        'end_time': end_time,
-                        'invoice_status': invoice_status,
-                        'selected': invoice_status == 'not_invoiced',  # Default selection
-                        'synopsis': '',  # Will be filled in during interactive session
-                        # New fields for override functionality
-                        'edited_start_time': None,
-                        'edited_duration': None,
-                        'custom_rate': None,
-                        'is_edited': False,
-                        'detection_source': detection_sources.get(email, 'unknown')
+            for email in matched_emails:
+                customer = customer_by_email[email]
+                customer_id = customer['id']
+                
+                # Generate unique meeting ID
+                meeting_id = self.generate_meeting_id(email, start_time, summary)
+                
+                customer_data = customers_with_meetings.get(customer_id)
+                if customer_data is None:
+                    customer_data = customers_with_meetings[customer_id] = {
+                        'customer': customer,
+                        'meetings': []
                     }
-                    customers_with_meetings[customer_id]['meetings'].append(meeting_info)
+                
+                # Add meeting details
+                meeting_info = {
+                    'id': meeting_id,
+                    'summary': summary,
+                    'date': meeting_date,
+                    'time': meeting_time,
+                    'duration': duration,
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'invoice_status': 'not_invoiced',  # Set once invoices are fetched below
+                    'selected': True,
+                    'synopsis': '',  # Will be filled in during interactive session
+                    # New fields for override functionality
+                    'edited_start_time': None,
+                    'edited_duration': None,
+                    'custom_rate': None,
+                    'is_edited': False,
+                    'detection_source': detection_sources.get(email, 'unknown')
+                }
+                customer_data['meetings'].append(meeting_info)
             
             # If no customer found and include_all_meetings is True, add to unassociated list
-            if not customer_found and include_all_meetings:
+            if not matched_emails:
                 # Generate unique ID for unassociated meeting
                 meeting_id = self.generate_meeting_id('unassociated', start_time, summary)
                 
@@ -539,6 +704,20 @@ class StripeCalendarInvoicer:
                 }
                 unassociated_meetings.append(unassociated_meeting)
         
+        # Invoice statuses are fetched once per customer. A meeting is only
+        # invoiced after it happens, so invoices created before the earliest
+        # customer meeting can't bill any of them (a day of slack covers all-day
+        # events and naive local times); internal events never enter into it
+        earliest_start = self._earliest_event_start(customer_events)
+        invoices_since = int(earliest_start - 86400) if earliest_start is not None else None
+        
+        for customer_id, data in customers_with_meetings.items():
+            # Meeting ID -> status for every invoiced meeting of this customer
+            statuses = data['invoice_statuses'] = self.get_meeting_invoice_statuses(customer_id, created_after=invoices_since)
+            for meeting in data['meetings']:
+                meeting['invoice_status'] = statuses.get(meeting['id'], 'not_invoiced')
+                meeting['selected'] = meeting['invoice_status'] == 'not_invoiced'  # Default selection
+        
         # Log results
         for customer_id, data in customers_with_meetings.items():
             customer = data['customer']
@@ -552,16 +731,20 @@ class StripeCalendarInvoicer:
         
         return customers_with_meetings, unassociated_meetings
     
+    def get_display_time(self, meeting):
+        """Meeting start time for display, preferring the edited start time"""
+        try:
+            return meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
+        except (AttributeError, ValueError):
+            return meeting['time']  # Fallback to original time
+    
     def edit_meeting_details(self, meeting, customer_data):
         """Interactive function to edit meeting start time and duration"""
         print(f"\n📝 EDITING MEETING: {meeting['summary']}")
         print(f"📅 Original: {meeting['date']} at {meeting['time']} ({meeting['duration']}h)")
         
         if meeting['is_edited']:
-            try:
-                current_time = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-            except (AttributeError, ValueError):
-                current_time = meeting['time']
+            current_time = self.get_display_time(meeting)
             current_duration = meeting['edited_duration'] if meeting['edited_duration'] else meeting['duration']
             print(f"📅 Current: {meeting['date']} at {current_time} ({current_duration}h)")
         
@@ -570,10 +753,7 @@ class StripeCalendarInvoicer:
         # Edit start time
         while True:
             try:
-                try:
-                    current_time_display = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-                except (AttributeError, ValueError):
-                    current_time_display = meeting['time']
+                current_time_display = self.get_display_time(meeting)
                 time_input = input(f"Start time [{current_time_display}]: ").strip()
                 
                 if not time_input:
@@ -621,10 +801,7 @@ class StripeCalendarInvoicer:
                                meeting['edited_duration'] is not None)
         
         # Show final result
-        try:
-            display_time = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-        except (AttributeError, ValueError):
-            display_time = meeting['time']
+        display_time = self.get_display_time(meeting)
         display_duration = meeting['edited_duration'] if meeting['edited_duration'] else meeting['duration']
         
         print(f"\n✅ Meeting updated:")
@@ -634,7 +811,7 @@ class StripeCalendarInvoicer:
         
         return True
     
-    def display_meetings_interactive(self, customers_with_meetings, default_hourly_rate, unassociated_meetings=None, all_customers=None):
+    def display_meetings_interactive(self, customers_with_meetings, default_hourly_rate, unassociated_meetings=None, all_customers=None, synopses=None):
         """Interactive session to select meetings and enter synopses
         
         Args:
@@ -642,6 +819,7 @@ class StripeCalendarInvoicer:
             default_hourly_rate: Default hourly rate
             unassociated_meetings: List of meetings not associated with any customer
             all_customers: List of all customers (for assignment)
+            synopses: Optional dict of meeting ID to synopsis; skips synopsis prompts
         """
         if unassociated_meetings is None:
             unassociated_meetings = []
@@ -685,10 +863,7 @@ class StripeCalendarInvoicer:
                     
                     # Use edited values if available
                     display_duration = meeting['edited_duration'] if meeting['edited_duration'] is not None else meeting['duration']
-                    try:
-                        display_time = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-                    except (AttributeError, ValueError):
-                        display_time = meeting['time']  # Fallback to original time
+                    display_time = self.get_display_time(meeting)
                     
                     # Use custom rate if available
                     rate_to_use = meeting['custom_rate'] if meeting['custom_rate'] is not None else hourly_rate
@@ -712,7 +887,8 @@ class StripeCalendarInvoicer:
                     if meeting['is_edited']:
                         print(f"    📅 Original: {meeting['date']} at {meeting['time']} ({meeting['duration']}h)")
                     
-                    print(f"    📊 Status: {status_text}")
+                    # The ID is what a --synopses-from file is keyed on
+                    print(f"    📊 Status: {status_text} · ID: {meeting['id']}")
                     print()
             
             # Display unassociated meetings if any
@@ -900,6 +1076,9 @@ class StripeCalendarInvoicer:
                                     rate = self.validate_hourly_rate(rate_str)
                                     # Update customer rate in Stripe
                                     if self.set_customer_hourly_rate(customer_id, rate):
+                                        # Keep this run's copy in step with Stripe so the display
+                                        # and the invoices use the new rate
+                                        data['customer'].setdefault('metadata', {})['hourly_rate'] = str(rate)
                                         print(f"✓ Updated hourly rate for {customer_email}: ${rate}/hour")
                                         # Refresh display after change
                                         meeting_map, unassociated_map = display_meeting_list()
@@ -967,7 +1146,8 @@ class StripeCalendarInvoicer:
                                 if customer_id not in customers_with_meetings:
                                     customers_with_meetings[customer_id] = {
                                         'customer': customer_found,
-                                        'meetings': []
+                                        'meetings': [],
+                                        'invoice_statuses': {}
                                     }
                                 
                                 # Create proper meeting structure for customer
@@ -1024,10 +1204,21 @@ class StripeCalendarInvoicer:
                 print(f"❌ Invalid command: '{command}'")
                 show_commands()
         
-        return self.get_synopsis_for_selected_meetings(customers_with_meetings)
+        return self.get_synopsis_for_selected_meetings(customers_with_meetings, synopses)
     
-    def get_synopsis_for_selected_meetings(self, customers_with_meetings):
-        """Get synopsis for each selected meeting"""
+    def get_synopsis_for_selected_meetings(self, customers_with_meetings, synopses=None):
+        """Get synopsis for each selected meeting
+        
+        If synopses (meeting ID to synopsis) is given, no prompts are shown;
+        meetings missing from it fall back to the meeting title.
+        """
+        if synopses is not None:
+            for data in customers_with_meetings.values():
+                for meeting in data['meetings']:
+                    if meeting['selected']:
+                        meeting['synopsis'] = synopses.get(meeting['id']) or meeting['summary']
+            return customers_with_meetings
+        
         print("\n" + "="*80)
         print("MEETING SYNOPSIS ENTRY")
         print("="*80)
@@ -1060,6 +1251,17 @@ class StripeCalendarInvoicer:
         
         return customers_with_meetings
     
+    def calculate_meeting_charge(self, meeting, hourly_rate):
+        """Return (duration, rate, amount in cents) for a meeting, applying any edited duration or custom rate"""
+        duration = meeting['edited_duration'] if meeting['edited_duration'] is not None else meeting['duration']
+        rate = meeting['custom_rate'] if meeting['custom_rate'] is not None else hourly_rate
+        return duration, rate, _amount_in_cents(duration, rate)
+    
+    def calculate_meeting_charges(self, meetings, hourly_rate):
+        """Return a (duration, rate, amount in cents) tuple for each meeting, in order"""
+        charge = self.calculate_meeting_charge
+        return [charge(meeting, hourly_rate) for meeting in meetings]
+    
     def show_invoice_confirmation(self, customers_with_meetings, default_hourly_rate):
         """Show confirmation of invoices to be created"""
         print("\n" + "="*80)
@@ -1078,28 +1280,19 @@ class StripeCalendarInvoicer:
             
             hourly_rate = self.get_customer_hourly_rate(customer, default_hourly_rate)
             
-            # Calculate total using override values
-            customer_total = 0
-            customer_hours = 0
-            for m in selected_meetings:
-                duration = m['edited_duration'] if m['edited_duration'] is not None else m['duration']
-                rate = m['custom_rate'] if m['custom_rate'] is not None else hourly_rate
-                customer_total += duration * rate
-                customer_hours += duration
+            # Price each meeting once (using override values) for both totals and lines;
+            # total the same whole cents the invoice line items will be billed at
+            charges = self.calculate_meeting_charges(selected_meetings, hourly_rate)
+            customer_total = sum(cents for _, _, cents in charges) / 100
+            customer_hours = sum(duration for duration, _, _ in charges)
             
             print(f"\n📧 {customer['name']} ({customer['email']})")
             print(f"   Hourly Rate: ${hourly_rate}/hour")
             print(f"   Total: {len(selected_meetings)} meetings, {customer_hours}h, ${customer_total:.2f}")
             print("   " + "-" * 50)
             
-            for meeting in selected_meetings:
-                duration = meeting['edited_duration'] if meeting['edited_duration'] is not None else meeting['duration']
-                rate = meeting['custom_rate'] if meeting['custom_rate'] is not None else hourly_rate
-                amount = duration * rate
-                try:
-                    display_time = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-                except (AttributeError, ValueError):
-                    display_time = meeting['time']  # Fallback to original time
+            for meeting, (duration, _, amount_cents) in zip(selected_meetings, charges):
+                display_time = self.get_display_time(meeting)
                 
                 meeting_line = f"   • {meeting['synopsis']}"
                 if meeting['is_edited']:
@@ -1108,7 +1301,7 @@ class StripeCalendarInvoicer:
                     meeting_line += f" 💰${meeting['custom_rate']}/h"
                 
                 print(meeting_line)
-                print(f"     {meeting['date']} at {display_time} ({duration}h) - ${amount:.2f}")
+                print(f"     {meeting['date']} at {display_time} ({duration}h) - ${amount_cents / 100:.2f}")
             
             total_amount += customer_total
             total_meetings += len(selected_meetings)
@@ -1127,9 +1320,41 @@ class StripeCalendarInvoicer:
             else:
                 print("Please enter 'y' or 'n'")
     
+    def preview_invoice(self, customer, meetings, hourly_rate):
+        """Build the invoice line items for meetings without calling Stripe
+        
+        Returns a list of line item dicts (customer, amount in cents, currency,
+        description) in meeting order, ready to post once an invoice exists.
+        """
+        line_items = []
+        # Use override values if available
+        charges = self.calculate_meeting_charges(meetings, hourly_rate)
+        for meeting, (duration, rate, amount_cents) in zip(meetings, charges):
+            # Use edited time if available
+            display_time = self.get_display_time(meeting)
+            
+            # Create description with meeting ID and synopsis
+            description = f"{meeting['synopsis']} - {meeting['date']} at {display_time} ({duration}h @ ${rate}/h) [ID:{meeting['id']}]"
+            
+            line_items.append({
+                'customer': customer['id'],
+                'amount': amount_cents,
+                'currency': 'usd',
+                'description': description
+            })
+        
+        return line_items
+    
     def create_draft_invoice(self, customer, meetings, hourly_rate):
         """Create a draft invoice for a customer with meetings as line items"""
+        if not meetings:
+            logger.info(f"No meetings to invoice for {customer['name']}; skipping invoice creation")
+            return None
+        
         try:
+            # Build line items first so a bad meeting can't leave an empty draft behind
+            line_items = self.preview_invoice(customer, meetings, hourly_rate)
+            
             # Create the invoice
             invoice_data = {
                 'customer': customer['id'],
@@ -1141,34 +1366,13 @@ class StripeCalendarInvoicer:
             
             invoice = stripe.Invoice.create(**invoice_data)
             
-            # Add line item for each meeting
-            total_amount = 0
-            for meeting in meetings:
-                # Use override values if available
-                duration = meeting['edited_duration'] if meeting['edited_duration'] is not None else meeting['duration']
-                rate = meeting['custom_rate'] if meeting['custom_rate'] is not None else hourly_rate
-                amount = duration * rate
-                total_amount += amount
-                
-                # Use edited time if available
-                try:
-                    display_time = meeting['edited_start_time'].strftime("%I:%M %p") if meeting['edited_start_time'] else meeting['time']
-                except (AttributeError, ValueError):
-                    display_time = meeting['time']  # Fallback to original time
-                
-                # Create description with meeting ID and synopsis
-                description = f"{meeting['synopsis']} - {meeting['date']} at {display_time} ({duration}h @ ${rate}/h) [ID:{meeting['id']}]"
-                
-                stripe.InvoiceItem.create(
-                    customer=customer['id'],
-                    invoice=invoice.id,
-                    amount=int(amount * 100),  # Convert to cents
-                    currency='usd',
-                    description=description
-                )
-                
-                logger.info(f"Added line item: {meeting['synopsis']} - ${amount:.2f}")
+            # Post line items one at a time, in meeting order: Stripe lists them by
+            # creation time, and a failure stops before any later item lands
+            for meeting, item in zip(meetings, line_items):
+                stripe.InvoiceItem.create(invoice=invoice.id, **item)
+                logger.info(f"Added line item: {meeting['synopsis']} - ${item['amount'] / 100:.2f}")
             
+            total_amount = sum(item['amount'] for item in line_items) / 100
             logger.info(f"Created draft invoice {invoice.id} for {customer['name']} - Total: ${total_amount:.2f}")
             return invoice
             
@@ -1176,7 +1380,18 @@ class StripeCalendarInvoicer:
             logger.error(f"Error creating invoice for {customer['name']}: {e}")
             return None
     
-    def run_automation(self, default_hourly_rate=250.00, include_all_meetings=False, force_interactive=False):
+    def fetch_customers_and_events(self, start_date, end_date):
+        """Fetch Stripe customers and calendar events concurrently
+        
+        The two requests are independent, so overlapping them saves one
+        round trip of latency. Returns (customers, events).
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            customers_future = executor.submit(self.get_stripe_customers)
+            events_future = executor.submit(self.get_calendar_events, start_date, end_date)
+            return customers_future.result(), events_future.result()
+    
+    def run_automation(self, default_hourly_rate=250.00, include_all_meetings=False, force_interactive=False, synopses=None):
         """
         Run the complete automation process with interactive selection
         
@@ -1184,20 +1399,19 @@ class StripeCalendarInvoicer:
             default_hourly_rate: Default hourly rate for customers without a specific rate set
             include_all_meetings: If True, show all meetings including unassociated ones
             force_interactive: If True, enter interactive mode even if no customer meetings found
+            synopses: Optional dict of meeting ID to synopsis, used instead of prompting
         """
         logger.info("Starting invoice automation...")
         
-        # Step 1: Get Stripe customers
-        customers = self.get_stripe_customers()
+        # Steps 1-2: Get Stripe customers and calendar events from the last X days
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=self.days_back)
+        
+        customers, events = self.fetch_customers_and_events(start_date, end_date)
         if not customers:
             logger.error("No customers found. Exiting.")
             return
         
-        # Step 2: Get calendar events from the last X days
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=self.days_back)
-        
-        events = self.get_calendar_events(start_date, end_date)
         if not events:
             logger.info("No calendar events found in the specified period.")
             return
@@ -1222,7 +1436,8 @@ class StripeCalendarInvoicer:
             customers_with_meetings, 
             default_hourly_rate,
             unassociated_meetings=unassociated_meetings if include_all_meetings else None,
-            all_customers=customers
+            all_customers=customers,
+            synopses=synopses
         )
         
         # Step 5: Show confirmation and create invoices
@@ -1264,6 +1479,8 @@ def main():
                         help='Include all calendar meetings, not just those with known customers')
     parser.add_argument('--interactive', '-i', action='store_true',
                         help='Force interactive mode even if no customer meetings are found')
+    parser.add_argument('--synopses-from', metavar='FILE',
+                        help='JSON file mapping meeting IDs to synopses (skips synopsis prompts)')
     
     args = parser.parse_args()
     
@@ -1280,6 +1497,20 @@ def main():
         logger.error("Copy config.env.template to .env and fill in your values")
         return
     
+    synopses = None
+    if args.synopses_from:
+        try:
+            with open(args.synopses_from) as f:
+                synopses = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read synopses file {args.synopses_from}: {e}")
+            return
+        
+        # Synopses become invoice line descriptions, so reject anything but ID -> text
+        if not isinstance(synopses, dict) or not all(isinstance(synopsis, str) for synopsis in synopses.values()):
+            logger.error(f"Synopses file {args.synopses_from} must map meeting IDs to synopsis strings")
+            return
+    
     print("🚀 Stripe Customer Meeting Invoice Automation")
     print(f"📅 Checking meetings from the last {DAYS_BACK} days...")
     print(f"💰 Default hourly rate: ${DEFAULT_HOURLY_RATE}/hour")
@@ -1305,7 +1536,8 @@ def main():
     invoicer.run_automation(
         default_hourly_rate=DEFAULT_HOURLY_RATE,
         include_all_meetings=args.include_all_meetings,
-        force_interactive=args.interactive
+        force_interactive=args.interactive,
+        synopses=synopses
     )
 
 if __name__ == "__main__":
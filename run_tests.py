@@ -40,6 +40,11 @@ def main():
         action='store_true',
         help='Stop on first failure'
     )
+    parser.add_argument(
+        '--parallel',
+        action='store_true',
+        help='Run test files in parallel worker processes (requires pytest-xdist)'
+    )
     parser.add_argument(
         '--marker', '-m',
         help='Run tests with specific marker'
@@ -63,6 +68,10 @@ def main():
     if args.failfast:
         cmd.append('-x')
     
+    if args.parallel:
+        # Keep each file on one worker so its fixtures are only set up there
+        cmd.extend(['-n', 'auto', '--dist=loadfile'])
+    
     if args.coverage:
         cmd.extend(['--cov=invoice_automation', '--cov-report=term-missing'])
     
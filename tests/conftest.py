@@ -2,7 +2,10 @@
 Shared fixtures and configuration for pytest test suite
 """
 import pytest
+from collections import namedtuple
 from datetime import datetime, timedelta
+from types import MappingProxyType, SimpleNamespace
+from unittest.mock import Mock, patch
 import json
 import os
 import sys
@@ -10,32 +13,42 @@ import sys
 # Add parent directory to path so we can import invoice_automation
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-@pytest.fixture
+# Invoice line items are only ever read for their description
+InvoiceLine = namedtuple('InvoiceLine', 'description')
+
+@pytest.fixture(autouse=True)
+def stripe_stub(monkeypatch):
+    """Fake stripe module for invoice_automation so no test can reach the Stripe API
+
+    Tests request this fixture and set return values/side effects on it,
+    e.g. stripe_stub.Invoice.create.return_value = ...
+    """
+    import stripe
+    fake = SimpleNamespace(
+        api_key=None,
+        Customer=Mock(),
+        Invoice=Mock(),
+        InvoiceItem=Mock(),
+        error=stripe.error
+    )
+    monkeypatch.setattr('invoice_automation.stripe', fake)
+    return fake
+
+@pytest.fixture(scope='session')
 def sample_customer():
-    """Sample Stripe customer data"""
-    return {
+    """Sample Stripe customer data (read-only, including metadata)"""
+    return MappingProxyType({
         'id': 'cus_TEST123',
         'email': 'test@example.com',
         'name': 'Test Customer',
         'created': 1609459200,
-        'metadata': {'hourly_rate': '200.00'}
-    }
+        'metadata': MappingProxyType({'hourly_rate': '200.00'})
+    })
 
-@pytest.fixture
-def sample_customer_no_rate():
-    """Sample Stripe customer without hourly rate"""
-    return {
-        'id': 'cus_TEST456',
-        'email': 'norak@example.com',
-        'name': 'No Rate Customer',
-        'created': 1609459200,
-        'metadata': {}
-    }
-
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_meeting():
-    """Sample meeting data structure"""
-    return {
+    """Sample meeting data structure (read-only; copy it with dict() to modify)"""
+    return MappingProxyType({
         'id': 'meet_123',
         'summary': 'Test Meeting',
         'date': '2025-01-15',
@@ -50,12 +63,12 @@ def sample_meeting():
         'edited_duration': None,
         'custom_rate': None,
         'is_edited': False
-    }
+    })
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_edited_meeting():
-    """Sample meeting with edited time and duration"""
-    meeting = {
+    """Sample meeting with edited time and duration (read-only; copy it with dict() to modify)"""
+    return MappingProxyType({
         'id': 'meet_456',
         'summary': 'Edited Meeting',
         'date': '2025-01-16',
@@ -70,8 +83,7 @@ def sample_edited_meeting():
         'edited_duration': 2.5,
         'custom_rate': 250.0,
         'is_edited': True
-    }
-    return meeting
+    })
 
 @pytest.fixture
 def sample_calendar_event():
@@ -87,10 +99,10 @@ def sample_calendar_event():
         ]
     }
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_invoice():
-    """Sample Stripe invoice"""
-    return {
+    """Sample Stripe invoice (read-only)"""
+    return MappingProxyType({
         'id': 'inv_TEST123',
         'customer': 'cus_TEST123',
         'status': 'draft',
@@ -101,7 +113,27 @@ def sample_invoice():
                 }
             ]
         }
-    }
+    })
+
+@pytest.fixture
+def make_invoice():
+    """Factory for Stripe-shaped invoices: make_invoice(status, *line_descriptions, **other_fields)"""
+    def make(status, *descriptions, **fields):
+        lines = SimpleNamespace(data=[InvoiceLine(d) for d in descriptions])
+        return SimpleNamespace(status=status, lines=lines, **fields)
+    return make
+
+@pytest.fixture
+def sample_invoice_obj(sample_invoice, make_invoice):
+    """sample_invoice as the attribute-style object the Stripe client returns"""
+    descriptions = [item['description'] for item in sample_invoice['lines']['data']]
+    return make_invoice(sample_invoice['status'], *descriptions,
+                        id=sample_invoice['id'], customer=sample_invoice['customer'])
+
+@pytest.fixture
+def sample_invoice_obj_sent(sample_invoice_obj):
+    """sample_invoice_obj after it has been finalized and sent (shares its line items)"""
+    return SimpleNamespace(**{**vars(sample_invoice_obj), 'status': 'open'})
 
 @pytest.fixture
 def mock_stripe_customers():
@@ -177,6 +209,107 @@ def test_invoicer(mocker):
     
     return invoicer
 
+@pytest.fixture
+def invoice_store(test_invoicer, monkeypatch):
+    """Serve test_invoicer's Stripe invoices from a dict keyed by customer ID
+
+    Tests fill it directly, e.g. ``invoice_store['cus_TEST123'] = [invoice]``;
+    customers without an entry have no invoices.
+    """
+    store = {}
+    monkeypatch.setattr(
+        test_invoicer,
+        'get_customer_invoices',
+        lambda customer_id, created_after=None: store.get(customer_id, [])
+    )
+    return store
+
+@pytest.fixture(scope='session')
+def shared_invoicer():
+    """One StripeCalendarInvoicer shared by tests that only call pure methods
+
+    For parsing, hashing, matching, search and interactive prompt tests.
+    Never patch or mutate it; tests that do should use the per-test
+    test_invoicer instead.
+    """
+    from invoice_automation import StripeCalendarInvoicer
+    
+    with patch.object(StripeCalendarInvoicer, '_get_calendar_service', return_value=Mock()), \
+         patch('invoice_automation.stripe'):
+        return StripeCalendarInvoicer(
+            stripe_api_key='sk_test_fake_key',
+            calendar_credentials_file='test_credentials.json',
+            token_file='test_token.json',
+            days_back=7
+        )
+
+@pytest.fixture
+def bare_invoicer():
+    """StripeCalendarInvoicer built without __init__, so nothing authenticates
+
+    Only the attributes _get_calendar_service reads are set.
+    """
+    from invoice_automation import StripeCalendarInvoicer
+    
+    invoicer = StripeCalendarInvoicer.__new__(StripeCalendarInvoicer)
+    invoicer.token_file = 'test_token.json'
+    invoicer.calendar_scopes = ['test_scope']
+    invoicer.calendar_credentials_file = 'test_credentials.json'
+    return invoicer
+
+@pytest.fixture
+def auth_mocks(mocker, bare_invoicer):
+    """Patch everything _get_calendar_service touches, defaulting to a successful fresh login
+
+    Returns a namespace holding bare_invoicer as ``invoicer``, the mock
+    handles, and ``printed``, the list of printed lines. By default there is
+    no token file and the OAuth flow succeeds; tests override only what
+    their scenario needs, e.g. ``auth_mocks.exists.return_value = True``.
+    """
+    # Plain records rather than Mocks: credentials are only read, never asserted on
+    # Token loaded from disk; tests make it expired or invalid as needed
+    stored_creds = SimpleNamespace(valid=True, expired=False, refresh_token=None)
+    # Credentials returned by a fresh OAuth login
+    new_creds = SimpleNamespace(valid=True, to_json=lambda: '{"token": "data"}')
+    flow = Mock()
+    flow.run_local_server.return_value = new_creds
+    service = Mock()
+    
+    # Printed lines, joined the way print would, for message assertions
+    printed = []
+    
+    mocker.patch('invoice_automation.Request')
+    return SimpleNamespace(
+        invoicer=bare_invoicer,
+        stored_creds=stored_creds,
+        flow=flow,
+        service=service,
+        exists=mocker.patch('os.path.exists', return_value=False),
+        from_file=mocker.patch('invoice_automation.Credentials.from_authorized_user_file', return_value=stored_creds),
+        flow_from_secrets=mocker.patch('invoice_automation.InstalledAppFlow.from_client_secrets_file', return_value=flow),
+        build=mocker.patch('invoice_automation.build', return_value=service),
+        open=mocker.patch('builtins.open', mocker.mock_open()),
+        remove=mocker.patch('os.remove'),
+        input=mocker.patch('builtins.input'),
+        print=mocker.patch('builtins.print', side_effect=lambda *args, **kwargs: printed.append(' '.join(map(str, args)))),
+        printed=printed,
+    )
+
+@pytest.fixture
+def expired_token(auth_mocks):
+    """auth_mocks with a stored token that has expired and fails to refresh"""
+    from google.auth.exceptions import RefreshError
+    
+    def refresh(request):
+        raise RefreshError("Token expired")
+    
+    auth_mocks.exists.return_value = True
+    auth_mocks.stored_creds.valid = False
+    auth_mocks.stored_creds.expired = True
+    auth_mocks.stored_creds.refresh_token = 'refresh_token'
+    auth_mocks.stored_creds.refresh = refresh
+    return auth_mocks
+
 @pytest.fixture
 def mock_input(mocker):
     """Helper to mock user input"""
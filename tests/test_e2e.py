@@ -2,15 +2,17 @@
 End-to-end tests for complete invoice automation workflows
 """
 import pytest
-from unittest.mock import Mock, MagicMock, call, patch
+from unittest.mock import Mock, call, patch
 from datetime import datetime, timedelta, time
+from types import SimpleNamespace
+import threading
 import stripe
 
 
 class TestEndToEndScenarios:
     """Test complete workflows from meeting detection to invoice creation"""
     
-    def test_single_customer_multiple_meetings_workflow(self, test_invoicer, mocker):
+    def test_single_customer_multiple_meetings_workflow(self, test_invoicer, invoice_store, stripe_stub, mocker):
         """Test complete workflow with one customer and multiple meetings"""
         # Mock data
         customer = {
@@ -38,9 +40,6 @@ class TestEndToEndScenarios:
             }
         ]
         
-        # Mock invoice status check (all not invoiced)
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Find customers with meetings
         customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], calendar_events)
         
@@ -68,9 +67,9 @@ class TestEndToEndScenarios:
         assert meetings[1]['synopsis'] == 'Project status update'
         
         # Mock invoice creation
-        mock_invoice_create = mocker.patch('stripe.Invoice.create')
-        mock_invoice_create.return_value = MagicMock(id='inv_TEST123')
-        mock_item_create = mocker.patch('stripe.InvoiceItem.create')
+        mock_invoice_create = stripe_stub.Invoice.create
+        mock_invoice_create.return_value = SimpleNamespace(id='inv_TEST123')
+        mock_item_create = stripe_stub.InvoiceItem.create
         
         # Create invoice
         selected_meetings = [m for m in meetings if m['selected']]
@@ -85,7 +84,7 @@ class TestEndToEndScenarios:
         assert calls[0][1]['amount'] == 20000  # 1 hour * $200 = $200 in cents
         assert calls[1][1]['amount'] == 30000  # 1.5 hours * $200 = $300 in cents
     
-    def test_edited_meeting_workflow(self, test_invoicer, mocker):
+    def test_edited_meeting_workflow(self, test_invoicer, invoice_store, stripe_stub, mocker):
         """Test workflow with edited meeting times and durations"""
         # Mock data
         customer = {
@@ -103,9 +102,6 @@ class TestEndToEndScenarios:
             'attendees': [{'email': 'bob@company.com'}]
         }
         
-        # Mock APIs
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Find meetings
         customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], [calendar_event])
         meeting = customers_with_meetings['cus_BOB']['meetings'][0]
@@ -129,9 +125,9 @@ class TestEndToEndScenarios:
         assert meeting['is_edited'] is True
         
         # Mock invoice creation
-        mock_invoice_create = mocker.patch('stripe.Invoice.create')
-        mock_invoice_create.return_value = MagicMock(id='inv_TEST456')
-        mock_item_create = mocker.patch('stripe.InvoiceItem.create')
+        mock_invoice_create = stripe_stub.Invoice.create
+        mock_invoice_create.return_value = SimpleNamespace(id='inv_TEST456')
+        mock_item_create = stripe_stub.InvoiceItem.create
         
         # Create invoice
         selected_meetings = [meeting]
@@ -143,7 +139,7 @@ class TestEndToEndScenarios:
         assert '3:30 PM' in call_args['description']
         assert '2.5h' in call_args['description']
     
-    def test_custom_rate_workflow(self, test_invoicer, mocker):
+    def test_custom_rate_workflow(self, test_invoicer, invoice_store, stripe_stub, mocker):
         """Test workflow with custom rates per meeting"""
         # Mock data
         customer = {
@@ -170,9 +166,6 @@ class TestEndToEndScenarios:
             }
         ]
         
-        # Mock APIs
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Find meetings
         customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], calendar_events)
         meetings = customers_with_meetings['cus_CHARLIE']['meetings']
@@ -195,9 +188,9 @@ class TestEndToEndScenarios:
         assert meetings[1]['custom_rate'] == 350.0
         
         # Mock invoice creation
-        mock_invoice_create = mocker.patch('stripe.Invoice.create')
-        mock_invoice_create.return_value = MagicMock(id='inv_TEST789')
-        mock_item_create = mocker.patch('stripe.InvoiceItem.create')
+        mock_invoice_create = stripe_stub.Invoice.create
+        mock_invoice_create.return_value = SimpleNamespace(id='inv_TEST789')
+        mock_item_create = stripe_stub.InvoiceItem.create
         
         # Create invoice
         invoice = test_invoicer.create_draft_invoice(customer, meetings, 150.0)
@@ -207,7 +200,7 @@ class TestEndToEndScenarios:
         assert calls[0][1]['amount'] == 17500  # 1 hour * $175 = $175 in cents
         assert calls[1][1]['amount'] == 70000  # 2 hours * $350 = $700 in cents
     
-    def test_customer_rate_update_workflow(self, test_invoicer, mocker):
+    def test_customer_rate_update_workflow(self, test_invoicer, invoice_store, stripe_stub, mocker):
         """Test updating customer default rate during workflow"""
         customer = {
             'id': 'cus_DAVE',
@@ -224,11 +217,8 @@ class TestEndToEndScenarios:
             'attendees': [{'email': 'dave@company.com'}]
         }
         
-        # Mock APIs
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Mock customer rate update
-        mock_customer_modify = mocker.patch('stripe.Customer.modify')
+        mock_customer_modify = stripe_stub.Customer.modify
         
         # Find meetings
         customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], [calendar_event])
@@ -249,8 +239,12 @@ class TestEndToEndScenarios:
             'cus_DAVE',
             metadata={'hourly_rate': '200.0'}
         )
+        
+        # The new rate applies for the rest of this run
+        updated_customer = customers_with_meetings['cus_DAVE']['customer']
+        assert test_invoicer.get_customer_hourly_rate(updated_customer, 150.0) == 200.0
     
-    def test_edge_case_no_meetings(self, test_invoicer, mocker):
+    def test_edge_case_no_meetings(self, shared_invoicer):
         """Test behavior when no meetings are found"""
         customer = {
             'id': 'cus_EMPTY',
@@ -260,12 +254,12 @@ class TestEndToEndScenarios:
         }
         
         # Find meetings with empty events
-        customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], [])
+        customers_with_meetings, _ = shared_invoicer.find_customers_with_meetings([customer], [])
         
         # Should return empty dict
         assert customers_with_meetings == {}
     
-    def test_edge_case_all_meetings_invoiced(self, test_invoicer, mocker):
+    def test_edge_case_all_meetings_invoiced(self, test_invoicer, invoice_store, make_invoice):
         """Test behavior when all meetings are already invoiced"""
         customer = {
             'id': 'cus_INVOICED',
@@ -282,8 +276,10 @@ class TestEndToEndScenarios:
             'attendees': [{'email': 'invoiced@company.com'}]
         }
         
-        # Mock all meetings as already invoiced
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='sent')
+        # Mock an open invoice that already contains this meeting
+        meeting_id = test_invoicer.generate_meeting_id('invoiced@company.com', '2025-01-15T10:00:00', 'Already Billed Meeting')
+        sent_invoice = make_invoice('open', f"Already Billed Meeting [ID:{meeting_id}]")
+        invoice_store[customer['id']] = [sent_invoice]
         
         # Find meetings
         customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], [calendar_event])
@@ -293,17 +289,20 @@ class TestEndToEndScenarios:
         meeting = customers_with_meetings['cus_INVOICED']['meetings'][0]
         assert meeting['invoice_status'] == 'sent'
         assert meeting['selected'] is False
+        
+        # The customer record keeps the status map the lookup came from
+        assert customers_with_meetings['cus_INVOICED']['invoice_statuses'] == {meeting_id: 'sent'}
     
-    def test_error_recovery_stripe_failure(self, test_invoicer, mocker):
+    def test_error_recovery_stripe_failure(self, test_invoicer, stripe_stub, mocker):
         """Test graceful handling of Stripe API failures"""
         # Mock Stripe error
-        mocker.patch('stripe.Customer.list').side_effect = stripe.error.APIError("Stripe is down")
+        stripe_stub.Customer.list.side_effect = stripe.error.APIError("Stripe is down")
         
         # Should return empty customer list
         customers = test_invoicer.get_stripe_customers()
         assert customers == []
     
-    def test_error_recovery_calendar_failure(self, test_invoicer, mocker):
+    def test_error_recovery_calendar_failure(self, shared_invoicer):
         """Test graceful handling of Calendar API failures"""
         customer = {
             'id': 'cus_TEST',
@@ -313,5 +312,27 @@ class TestEndToEndScenarios:
         }
         
         # Test with empty events (simulating calendar fetch failure)
-        customers_with_meetings, _ = test_invoicer.find_customers_with_meetings([customer], [])
-        assert customers_with_meetings == {}
\ No newline at end of file
+        customers_with_meetings, _ = shared_invoicer.find_customers_with_meetings([customer], [])
+        assert customers_with_meetings == {}
+    
+    def test_customers_and_events_fetched_concurrently(self, test_invoicer, mocker):
+        """Test Stripe and Calendar fetches overlap instead of running back to back"""
+        # Each fetch waits at the barrier, so this only completes if both run at once
+        barrier = threading.Barrier(2, timeout=5)
+        
+        def fetch_customers():
+            barrier.wait()
+            return [{'id': 'cus_TEST'}]
+        
+        def fetch_events(start_date, end_date):
+            barrier.wait()
+            return [{'id': 'evt_1'}]
+        
+        mocker.patch.object(test_invoicer, 'get_stripe_customers', side_effect=fetch_customers)
+        mocker.patch.object(test_invoicer, 'get_calendar_events', side_effect=fetch_events)
+        
+        end_date = datetime.now()
+        customers, events = test_invoicer.fetch_customers_and_events(end_date - timedelta(days=7), end_date)
+        
+        assert customers == [{'id': 'cus_TEST'}]
+        assert events == [{'id': 'evt_1'}]
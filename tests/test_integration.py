@@ -2,18 +2,19 @@
 Integration tests for Stripe and Google Calendar API interactions
 """
 import pytest
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import Mock, patch
+from types import SimpleNamespace
 import stripe
 from datetime import datetime, timedelta
+from invoice_automation import _mention_index
 
 
 class TestStripeIntegration:
     """Test Stripe API integration with mocked responses"""
     
-    def test_get_stripe_customers_success(self, test_invoicer, mocker, mock_stripe_customers):
+    def test_get_stripe_customers_success(self, test_invoicer, stripe_stub, mocker, mock_stripe_customers):
         """Test successful customer fetching from Stripe"""
         # Convert dict customers to object-like structure
-        from types import SimpleNamespace
         customer_objects = []
         for c in mock_stripe_customers:
             obj = SimpleNamespace(**c)
@@ -21,11 +22,8 @@ class TestStripeIntegration:
             customer_objects.append(obj)
         
         # Mock stripe.Customer.list to return our test data
-        mock_list = mocker.patch('stripe.Customer.list')
-        mock_list.return_value = MagicMock(
-            data=customer_objects,
-            has_more=False
-        )
+        mock_list = stripe_stub.Customer.list
+        mock_list.return_value.auto_paging_iter.return_value = iter(customer_objects)
         
         customers = test_invoicer.get_stripe_customers()
         
@@ -38,47 +36,33 @@ class TestStripeIntegration:
         assert customers[1]['email'] == 'bob@company2.com'
         assert customers[2]['email'] == 'charlie@company3.com'
     
-    def test_get_stripe_customers_pagination(self, test_invoicer, mocker):
-        """Test customer fetching with pagination"""
-        from types import SimpleNamespace
-        
-        # First page
+    def test_get_stripe_customers_pagination(self, test_invoicer, stripe_stub, mocker):
+        """Test customer fetching across multiple pages"""
+        # Customers spanning two pages, flattened by auto_paging_iter
         first_page_data = [
             SimpleNamespace(id='cus_1', email='customer1@test.com', name='Customer 1', created=1609459200, metadata={}),
             SimpleNamespace(id='cus_2', email='customer2@test.com', name='Customer 2', created=1609459200, metadata={})
         ]
-        first_page = MagicMock(
-            data=first_page_data,
-            has_more=True
-        )
-        
-        # Second page
         second_page_data = [
             SimpleNamespace(id='cus_3', email='customer3@test.com', name='Customer 3', created=1609459200, metadata={})
         ]
-        second_page = MagicMock(
-            data=second_page_data,
-            has_more=False
-        )
         
-        mock_list = mocker.patch('stripe.Customer.list')
-        mock_list.side_effect = [first_page, second_page]
+        mock_list = stripe_stub.Customer.list
+        mock_list.return_value.auto_paging_iter.return_value = iter(first_page_data + second_page_data)
         
         customers = test_invoicer.get_stripe_customers()
         
-        # Verify pagination calls
-        assert mock_list.call_count == 2
-        mock_list.assert_any_call(limit=100)
-        mock_list.assert_any_call(limit=100, starting_after='cus_2')
+        # Paging is handled by the Stripe client from a single list request
+        mock_list.assert_called_once_with(limit=100)
         
         # Verify all customers returned
         assert len(customers) == 3
         assert customers[0]['email'] == 'customer1@test.com'
         assert customers[2]['email'] == 'customer3@test.com'
     
-    def test_get_stripe_customers_error_handling(self, test_invoicer, mocker):
+    def test_get_stripe_customers_error_handling(self, test_invoicer, stripe_stub, mocker):
         """Test error handling when fetching customers"""
-        mock_list = mocker.patch('stripe.Customer.list')
+        mock_list = stripe_stub.Customer.list
         mock_list.side_effect = stripe.error.APIError("API Error")
         
         customers = test_invoicer.get_stripe_customers()
@@ -86,9 +70,9 @@ class TestStripeIntegration:
         # Should return empty list on error
         assert customers == []
     
-    def test_set_customer_hourly_rate_success(self, test_invoicer, mocker):
+    def test_set_customer_hourly_rate_success(self, test_invoicer, stripe_stub, mocker):
         """Test setting customer hourly rate"""
-        mock_modify = mocker.patch('stripe.Customer.modify')
+        mock_modify = stripe_stub.Customer.modify
         
         result = test_invoicer.set_customer_hourly_rate('cus_TEST123', 250.0)
         
@@ -100,9 +84,9 @@ class TestStripeIntegration:
         
         assert result is True
     
-    def test_set_customer_hourly_rate_error(self, test_invoicer, mocker):
+    def test_set_customer_hourly_rate_error(self, test_invoicer, stripe_stub, mocker):
         """Test error handling when setting customer rate"""
-        mock_modify = mocker.patch('stripe.Customer.modify')
+        mock_modify = stripe_stub.Customer.modify
         mock_modify.side_effect = stripe.error.InvalidRequestError(
             "Customer not found", None
         )
@@ -111,33 +95,36 @@ class TestStripeIntegration:
         
         assert result is False
     
-    def test_get_customer_invoices_success(self, test_invoicer, mocker, sample_invoice):
+    def test_get_customer_invoices_success(self, test_invoicer, stripe_stub, mocker, sample_invoice):
         """Test fetching invoices for a customer"""
-        mock_list = mocker.patch('stripe.Invoice.list')
-        mock_list.return_value = MagicMock(data=[sample_invoice])
+        mock_list = stripe_stub.Invoice.list
+        mock_list.return_value = SimpleNamespace(data=[sample_invoice])
         
         invoices = test_invoicer.get_customer_invoices('cus_TEST123')
         
         # Verify the API call
         mock_list.assert_called_once_with(customer='cus_TEST123', limit=100)
         
+        # A creation cutoff narrows the listing server-side
+        test_invoicer.get_customer_invoices('cus_TEST123', created_after=1736899200)
+        mock_list.assert_called_with(customer='cus_TEST123', limit=100, created={'gte': 1736899200})
+        
         # Verify the returned data
         assert len(invoices) == 1
         assert invoices[0]['id'] == 'inv_TEST123'
     
-    def test_create_draft_invoice_success(self, test_invoicer, mocker, sample_customer, sample_meeting):
+    def test_create_draft_invoice_success(self, test_invoicer, stripe_stub, mocker, sample_customer, sample_meeting):
         """Test creating a draft invoice"""
         # Mock invoice creation
-        mock_invoice = MagicMock(id='inv_NEW123')
-        mock_create = mocker.patch('stripe.Invoice.create')
+        mock_invoice = SimpleNamespace(id='inv_NEW123')
+        mock_create = stripe_stub.Invoice.create
         mock_create.return_value = mock_invoice
         
         # Mock invoice item creation
-        mock_item_create = mocker.patch('stripe.InvoiceItem.create')
+        mock_item_create = stripe_stub.InvoiceItem.create
         
         # Create invoice with one meeting
-        meetings = [sample_meeting]
-        meetings[0]['synopsis'] = 'Test meeting discussion'
+        meetings = [dict(sample_meeting, synopsis='Test meeting discussion')]
         
         invoice = test_invoicer.create_draft_invoice(sample_customer, meetings, 200.0)
         
@@ -161,13 +148,25 @@ class TestStripeIntegration:
         
         assert invoice.id == 'inv_NEW123'
     
-    def test_create_draft_invoice_with_edited_meeting(self, test_invoicer, mocker, sample_customer, sample_edited_meeting):
+    def test_create_draft_invoice_stops_at_failed_line_item(self, test_invoicer, stripe_stub, sample_customer, sample_meeting):
+        """Test line items are posted in meeting order and nothing is posted after a failure"""
+        stripe_stub.Invoice.create.return_value = SimpleNamespace(id='inv_FAIL')
+        stripe_stub.InvoiceItem.create.side_effect = [None, Exception('lock_timeout'), None]
+        meetings = [dict(sample_meeting, synopsis=f'Session {n}') for n in (1, 2, 3)]
+
+        invoice = test_invoicer.create_draft_invoice(sample_customer, meetings, 200.0)
+
+        assert invoice is None
+        descriptions = [c[1]['description'] for c in stripe_stub.InvoiceItem.create.call_args_list]
+        assert [d.split(' - ')[0] for d in descriptions] == ['Session 1', 'Session 2']
+    
+    def test_create_draft_invoice_with_edited_meeting(self, test_invoicer, stripe_stub, mocker, sample_customer, sample_edited_meeting):
         """Test creating invoice with edited meeting values"""
-        mock_invoice = MagicMock(id='inv_NEW456')
-        mock_create = mocker.patch('stripe.Invoice.create')
+        mock_invoice = SimpleNamespace(id='inv_NEW456')
+        mock_create = stripe_stub.Invoice.create
         mock_create.return_value = mock_invoice
         
-        mock_item_create = mocker.patch('stripe.InvoiceItem.create')
+        mock_item_create = stripe_stub.InvoiceItem.create
         
         # Create invoice with edited meeting
         meetings = [sample_edited_meeting]
@@ -180,6 +179,36 @@ class TestStripeIntegration:
         assert '2.5h @ $250.0/h' in call_args['description']
         assert '11:30 AM' in call_args['description']  # Edited time
 
+    def test_create_draft_invoice_rounds_to_nearest_cent(self, test_invoicer, stripe_stub, sample_customer, sample_meeting):
+        """Test fractional hours are converted to cents without float truncation"""
+        stripe_stub.Invoice.create.return_value = SimpleNamespace(id='inv_NEW789')
+
+        meeting = dict(sample_meeting, duration=0.29)  # 0.29 * 100 * 100 is 2899.999... in floats
+        test_invoicer.create_draft_invoice(sample_customer, [meeting], 100.0)
+
+        assert stripe_stub.InvoiceItem.create.call_args[1]['amount'] == 2900
+
+    def test_preview_invoice_does_not_call_create(self, test_invoicer, stripe_stub, sample_customer, sample_meeting, sample_edited_meeting):
+        """Test previewing line items is local and matches what would be posted"""
+        meeting = dict(sample_meeting, synopsis='Test meeting discussion')
+
+        items = test_invoicer.preview_invoice(sample_customer, [meeting, sample_edited_meeting], 200.0)
+
+        assert [item['amount'] for item in items] == [20000, 62500]
+        assert items[0]['customer'] == 'cus_TEST123'
+        assert '[ID:meet_123]' in items[0]['description']
+        assert '11:30 AM' in items[1]['description']
+        stripe_stub.Invoice.create.assert_not_called()
+        stripe_stub.InvoiceItem.create.assert_not_called()
+
+    def test_create_draft_invoice_empty_meetings_no_api_call(self, test_invoicer, stripe_stub, sample_customer):
+        """Test no empty draft invoice is created when there are no meetings"""
+        invoice = test_invoicer.create_draft_invoice(sample_customer, [], 200.0)
+
+        assert invoice is None
+        assert stripe_stub.Invoice.create.call_count == 0
+        assert stripe_stub.InvoiceItem.create.call_count == 0
+
 
 class TestGoogleCalendarIntegration:
     """Test Google Calendar API integration"""
@@ -210,6 +239,7 @@ class TestGoogleCalendarIntegration:
             mock_events_api.list.return_value = mock_list_method
             
             mock_list_method.execute.return_value = {'items': mock_calendar_events}
+            mock_events_api.list_next.return_value = None  # Single page
             
             events = test_invoicer.get_calendar_events(time_min, time_max)
         
@@ -219,6 +249,25 @@ class TestGoogleCalendarIntegration:
         assert events[1]['summary'] == 'Project Review'
         assert events[2]['summary'] == 'Quick Check-in'
     
+    def test_get_calendar_events_pagination(self, test_invoicer, mock_calendar_events):
+        """Test events from every result page are returned in order"""
+        with patch.object(test_invoicer.calendar_service, 'events') as mock_events_method:
+            mock_events_api = Mock()
+            mock_events_method.return_value = mock_events_api
+            
+            first_page = Mock()
+            first_page.execute.return_value = {'items': mock_calendar_events[:2], 'nextPageToken': 'page2'}
+            second_page = Mock()
+            second_page.execute.return_value = {'items': mock_calendar_events[2:]}
+            mock_events_api.list.return_value = first_page
+            mock_events_api.list_next.side_effect = [second_page, None]
+            
+            time_max = datetime.utcnow()
+            events = test_invoicer.get_calendar_events(time_max - timedelta(days=7), time_max)
+        
+        assert [e['id'] for e in events] == ['evt_1', 'evt_2', 'evt_3']
+        assert mock_events_api.list_next.call_count == 2
+    
     def test_get_calendar_events_error_handling(self, test_invoicer, mocker):
         """Test error handling when fetching calendar events"""
         from googleapiclient.errors import HttpError
@@ -248,11 +297,11 @@ class TestGoogleCalendarIntegration:
     
     def test_find_customers_with_meetings(self, test_invoicer, mocker, mock_stripe_customers, mock_calendar_events):
         """Test matching calendar events to Stripe customers"""
-        # Mock check_meeting_invoice_status to return not_invoiced
-        mocker.patch.object(
+        # Mock get_customer_invoices so no meetings have been invoiced
+        mock_invoices = mocker.patch.object(
             test_invoicer,
-            'check_meeting_invoice_status',
-            return_value='not_invoiced'
+            'get_customer_invoices',
+            return_value=[]
         )
         
         # Call with customers and events as parameters
@@ -281,8 +330,70 @@ class TestGoogleCalendarIntegration:
         assert len(charlie_data['meetings']) == 1
         assert charlie_data['meetings'][0]['summary'] == 'Quick Check-in'
         assert charlie_data['meetings'][0]['duration'] == 0.5
-    
-    def test_find_customers_with_meetings_description_detection(self, test_invoicer, mocker):
+        
+        # Invoices are fetched once per customer, not once per meeting, and only
+        # those created since a day before the earliest meeting
+        assert mock_invoices.call_count == 3
+        earliest = datetime.fromisoformat(mock_calendar_events[0]['start']['dateTime']).timestamp()
+        for call in mock_invoices.call_args_list:
+            assert call.kwargs['created_after'] == int(earliest - 86400)
+
+    def test_find_customers_invoice_window_ignores_internal_events(self, test_invoicer, mocker, mock_stripe_customers):
+        """Test only customer meetings set how far back invoices are fetched"""
+        mock_invoices = mocker.patch.object(test_invoicer, 'get_customer_invoices', return_value=[])
+        events = [
+            {
+                'summary': 'Internal Planning',
+                'start': {'dateTime': '2025-01-05T10:00:00-05:00'},
+                'end': {'dateTime': '2025-01-05T11:00:00-05:00'},
+                'attendees': [{'email': 'teammate@mycompany.com'}]
+            },
+            {
+                'summary': 'Strategy Session',
+                'start': {'dateTime': '2025-01-15T10:00:00-05:00'},
+                'end': {'dateTime': '2025-01-15T11:00:00-05:00'},
+                'attendees': [{'email': mock_stripe_customers[0]['email']}]
+            }
+        ]
+
+        test_invoicer.find_customers_with_meetings(mock_stripe_customers, events)
+
+        earliest = datetime.fromisoformat('2025-01-15T10:00:00-05:00').timestamp()
+        mock_invoices.assert_called_once_with(mock_stripe_customers[0]['id'], created_after=int(earliest - 86400))
+
+    def test_find_customers_with_meetings_mixed_case_email(self, test_invoicer, invoice_store):
+        """Test customer emails match attendees regardless of case"""
+        customers = [{'id': 'cus_ALICE', 'email': 'Alice@TechCorp.com', 'name': 'Alice Johnson', 'metadata': {}}]
+        events = [{
+            'summary': 'Kickoff',
+            'start': {'dateTime': '2025-01-15T10:00:00-05:00'},
+            'end': {'dateTime': '2025-01-15T11:00:00-05:00'},
+            'attendees': [{'email': 'alice@techcorp.com'}]
+        }]
+
+        result, _ = test_invoicer.find_customers_with_meetings(customers, events)
+
+        assert list(result) == ['cus_ALICE']
+        assert result['cus_ALICE']['meetings'][0]['detection_source'] == 'attendee'
+
+    def test_find_customers_with_meetings_skips_timing_for_internal_events(self, test_invoicer, mocker, mock_stripe_customers):
+        """Test events without customers are not timed unless unassociated meetings are requested"""
+        events = [{
+            'summary': 'Internal Standup',
+            'start': {'dateTime': '2025-01-15T10:00:00-05:00'},
+            'end': {'dateTime': '2025-01-15T10:15:00-05:00'},
+            'attendees': [{'email': 'teammate@mycompany.com'}]
+        }]
+        mock_duration = mocker.patch.object(test_invoicer, 'calculate_meeting_duration', return_value=0.25)
+
+        result, unassociated = test_invoicer.find_customers_with_meetings(mock_stripe_customers, events)
+        assert result == {} and unassociated == []
+        mock_duration.assert_not_called()
+
+        _, unassociated = test_invoicer.find_customers_with_meetings(mock_stripe_customers, events, include_all_meetings=True)
+        assert unassociated[0]['duration'] == 0.25
+
+    def test_find_customers_with_meetings_description_detection(self, test_invoicer, invoice_store):
         """Test finding customers mentioned in meeting descriptions"""
         # Create test customers
         customers = [
@@ -316,9 +427,6 @@ class TestGoogleCalendarIntegration:
             }
         ]
         
-        # Mock invoice status check
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Find customers with meetings
         result, _ = test_invoicer.find_customers_with_meetings(customers, events)
         
@@ -343,7 +451,7 @@ class TestGoogleCalendarIntegration:
         assert charlie_data['meetings'][0]['summary'] == 'Team Meeting'
         assert charlie_data['meetings'][0]['detection_source'] == 'description'
     
-    def test_find_customers_mixed_detection_sources(self, test_invoicer, mocker):
+    def test_find_customers_mixed_detection_sources(self, test_invoicer, invoice_store):
         """Test finding customers via both attendees and descriptions"""
         customers = [
             {'id': 'cus_ALICE', 'email': 'alice@techcorp.com', 'name': 'Alice Johnson', 'metadata': {}},
@@ -360,8 +468,6 @@ class TestGoogleCalendarIntegration:
             }
         ]
         
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         result, _ = test_invoicer.find_customers_with_meetings(customers, events)
         
         # Both customers should be found
@@ -373,7 +479,42 @@ class TestGoogleCalendarIntegration:
         # Bob found in description
         assert result['cus_BOB']['meetings'][0]['detection_source'] == 'description'
     
-    def test_find_customers_no_description_fallback(self, test_invoicer, mocker):
+    def test_find_customers_description_mention_regex_misses(self, test_invoicer, invoice_store):
+        """Test a name mention finds a customer whose address the email regex can't extract"""
+        customers = [{'id': 'cus_PAT', 'email': "o'neil@acme.com", 'name': "Pat O'Neil", 'metadata': {}}]
+        events = [{
+            'summary': 'Intro Call',
+            'start': {'dateTime': '2025-01-15T10:00:00-05:00'},
+            'end': {'dateTime': '2025-01-15T11:00:00-05:00'},
+            'attendees': [],
+            'description': "Call with Pat O'Neil o'neil@acme.com"
+        }]
+        
+        result, _ = test_invoicer.find_customers_with_meetings(customers, events)
+        
+        assert list(result) == ['cus_PAT']
+        assert result['cus_PAT']['meetings'][0]['detection_source'] == 'description'
+    
+    def test_find_customers_builds_mention_index_once_per_run(self, test_invoicer, invoice_store, mocker):
+        """Test the mention index is built once per run, not per description"""
+        build_index = mocker.patch('invoice_automation._mention_index', wraps=_mention_index)
+        customers = [{'id': 'cus_ALICE', 'email': 'alice@techcorp.com', 'name': 'Alice Johnson', 'metadata': {}}]
+        events = [
+            {
+                'summary': f'Session {day}',
+                'start': {'dateTime': f'2025-01-{day}T10:00:00-05:00'},
+                'end': {'dateTime': f'2025-01-{day}T11:00:00-05:00'},
+                'description': 'Alice Johnson alice@techcorp.com is joining'
+            }
+            for day in (15, 16, 17)
+        ]
+        
+        result, _ = test_invoicer.find_customers_with_meetings(customers, events)
+        
+        assert len(result['cus_ALICE']['meetings']) == 3
+        build_index.assert_called_once_with(customers)
+    
+    def test_find_customers_no_description_fallback(self, test_invoicer, invoice_store):
         """Test that meetings without descriptions still work"""
         customers = [
             {'id': 'cus_ALICE', 'email': 'alice@techcorp.com', 'name': 'Alice Johnson', 'metadata': {}}
@@ -389,15 +530,13 @@ class TestGoogleCalendarIntegration:
             }
         ]
         
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         result, _ = test_invoicer.find_customers_with_meetings(customers, events)
         
         # Should still find Alice as attendee
         assert len(result) == 1
         assert result['cus_ALICE']['meetings'][0]['detection_source'] == 'attendee'
     
-    def test_find_customers_with_unassociated_meetings(self, test_invoicer, mocker):
+    def test_find_customers_with_unassociated_meetings(self, test_invoicer, invoice_store):
         """Test finding unassociated meetings when include_all_meetings is True"""
         customers = [
             {'id': 'cus_ALICE', 'email': 'alice@techcorp.com', 'name': 'Alice Johnson', 'metadata': {}}
@@ -428,8 +567,6 @@ class TestGoogleCalendarIntegration:
             }
         ]
         
-        mocker.patch.object(test_invoicer, 'check_meeting_invoice_status', return_value='not_invoiced')
-        
         # Test with include_all_meetings=False (default)
         result, unassociated = test_invoicer.find_customers_with_meetings(customers, events, include_all_meetings=False)
         assert len(result) == 1  # Only Alice's meeting